@@ -1,16 +1,57 @@
 import os
 import io
+import shutil
 import subprocess
-import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Per-step diagnostics are logged at DEBUG; set LOG_LEVEL=DEBUG to see them
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+_log_level = logging.getLevelName(LOG_LEVEL)
+logging.basicConfig(
+    # Unknown names come back as a 'Level X' string; don't fail startup over them
+    level=_log_level if isinstance(_log_level, int) else logging.INFO,
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+log = logging.getLogger(__name__)
+if not isinstance(_log_level, int):
+    log.warning('Unknown LOG_LEVEL %r, using INFO', LOG_LEVEL)
+
+# Threads OpenCV (and OpenMP-backed numpy/BLAS) may use inside a single request.
+# Flask already serves requests on separate threads, so default to half the cores;
+# lower this further when running several Gunicorn/uWSGI worker processes per host
+# (roughly cores / workers) to avoid oversubscription.
+# Must be set before numpy/cv2 are imported for OMP_NUM_THREADS to take effect.
+OPENCV_THREADS = int(os.getenv('OPENCV_THREADS', max(1, (os.cpu_count() or 2) // 2)))
+os.environ.setdefault('OMP_NUM_THREADS', str(OPENCV_THREADS))
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from PIL import Image
 import cv2
 import numpy as np
-from dotenv import load_dotenv
 
-load_dotenv()
+from pbm import to_pbm
+
+try:
+    # potracer (pure-Python Potrace port, imported as `potrace`) - trace in-process
+    from potrace import Bitmap as PotraceBitmap
+    POTRACER_AVAILABLE = True
+except ImportError:
+    POTRACER_AVAILABLE = False
+
+# The potrace executable is much faster than the pure-Python port, so the
+# in-process tracer is only used on hosts where the binary is not installed
+POTRACE_CLI_AVAILABLE = shutil.which('potrace') is not None
+
+cv2.setNumThreads(OPENCV_THREADS)
+cv2.setUseOptimized(True)
 
 app = Flask(__name__)
 CORS(app)
@@ -20,60 +61,156 @@ MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 10485760))  # 10MB
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
 
+# Overlap independent pipeline stages on a small thread pool.
+# Disable if OpenCV's own threading already saturates the cores.
+PARALLEL_STAGES = os.getenv('PARALLEL_STAGES', 'true').lower() == 'true'
+_STAGE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='stage')
+
+# Rectangular structuring elements shared by the morphology steps.
+# Two iterations with an NxN rectangle equal one pass with a (2N-1)x(2N-1) rectangle.
+_KERNEL3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+_KERNEL5 = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+_KERNEL9 = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9))
+
+# Spaghetti (Bolelli et al.) labeling is the fastest 8-connectivity CCL in OpenCV;
+# older builds without it fall back to the default algorithm
+_CCL_ALGORITHM = getattr(cv2, 'CCL_SPAGHETTI', cv2.CCL_DEFAULT)
+
+# CLAHE keeps scratch buffers inside the object, so cache one per request thread
+_thread_local = threading.local()
+
+
+def get_clahe():
+    clahe = getattr(_thread_local, 'clahe', None)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        _thread_local.clahe = clahe
+    return clahe
+
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def remove_background(image, threshold=220):
+@dataclass(slots=True, frozen=True)
+class ProcessOptions:
+    """Processing options parsed once from the /process form data."""
+    invert_colors: bool = False
+    min_artifact_size: int = 100
+    preserve_style: bool = True
+    turdsize: int = 15
+    fast_adaptive: bool = False
+    fast_mode: bool = False
+    
+    @classmethod
+    def from_form(cls, form):
+        if not form:
+            return DEFAULT_PROCESS_OPTIONS
+        get = form.get
+        return cls(
+            invert_colors=get('invertColors', 'false').lower() == 'true',
+            min_artifact_size=int(get('minArtifactSize', '100')),
+            preserve_style=get('preserveStyle', 'true').lower() == 'true',
+            turdsize=int(get('turdsize', '15')),
+            fast_adaptive=get('fastAdaptive', 'false').lower() == 'true',
+            fast_mode=get('fastMode', 'false').lower() == 'true'
+        )
+    
+    def to_dict(self):
+        return {
+            'invertColors': self.invert_colors,
+            'minArtifactSize': self.min_artifact_size,
+            'preserveStyle': self.preserve_style,
+            'turdsize': self.turdsize,
+            'fastAdaptive': self.fast_adaptive,
+            'fastMode': self.fast_mode
+        }
+
+
+DEFAULT_PROCESS_OPTIONS = ProcessOptions()
+
+
+def downscale(image, factor=2):
+    """Shrink image by an integer factor using area averaging"""
+    height, width = image.shape[:2]
+    size = (max(1, width // factor), max(1, height // factor))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def threshold_background(image, gray, threshold=220):
     """
-    Remove background using improved color-based segmentation.
-    More aggressive background removal for cleaner results.
+    Raw drawing mask (255 = drawing, 0 = background) from a BGR image
+    and its grayscale version, before any morphology.
     """
-    # Convert to RGB if needed
-    if len(image.shape) == 4:
-        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
-    
-    # Apply Gaussian blur to reduce noise before processing
-    blurred = cv2.GaussianBlur(image, (5, 5), 0)
-    
     # Convert to LAB color space for better color separation
-    lab = cv2.cvtColor(blurred, cv2.COLOR_BGR2LAB)
-    l, a, b = cv2.split(lab)
+    lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+    l = lab[:, :, 0]  # View of the L channel, no copy
     
-    # Use thresholding on L channel (lightness)
+    # Threshold L channel (lightness) and gray together in a single pass;
+    # the gray check also catches near-white colors the L channel lets through
     # Lower threshold (220 instead of 240) to capture more background
-    _, mask = cv2.threshold(l, threshold, 255, cv2.THRESH_BINARY_INV)
-    
-    # Also check for near-white colors in RGB space
-    gray = cv2.cvtColor(blurred, cv2.COLOR_BGR2GRAY)
-    _, gray_mask = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV)
-    
-    # Combine masks
-    mask = cv2.bitwise_and(mask, gray_mask)
-    
+    mask = np.logical_and(l <= threshold, gray <= threshold).view(np.uint8)
+    mask *= 255
+    return mask
+
+
+def clean_background_mask(mask):
+    """Close gaps, drop noise and pad edges of a full-resolution drawing mask."""
     # More aggressive morphological operations to clean up
-    kernel_small = np.ones((3, 3), np.uint8)
-    kernel_large = np.ones((5, 5), np.uint8)
+    # Close small gaps in the drawing (same as 5x5 close with 2 iterations)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, _KERNEL9)
     
-    # Close small gaps in the drawing
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel_large, iterations=2)
-    
-    # Remove small noise spots
-    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel_small, iterations=2)
+    # Remove small noise spots (same as 3x3 open with 2 iterations)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, _KERNEL5)
     
     # Dilate slightly to include edges
-    mask = cv2.dilate(mask, kernel_small, iterations=1)
+    mask = cv2.dilate(mask, _KERNEL3, iterations=1)
     
-    # Apply mask
-    result = cv2.bitwise_and(image, image, mask=mask)
+    return mask
+
+
+def build_background_mask(image, gray, threshold=220):
+    """
+    Build the drawing mask (255 = drawing, 0 = background) from a BGR image
+    and its grayscale version.
+    """
+    return clean_background_mask(threshold_background(image, gray, threshold))
+
+
+def detect_background(image, threshold=220, fast_mode=False):
+    """
+    Detect the paper background using color-based segmentation.
+    The mask is not applied here; apply_masks_to_binary does that after
+    binarization, together with the user mask.
     
-    # Create alpha channel
-    result = cv2.cvtColor(result, cv2.COLOR_BGR2BGRA)
-    result[:, :, 3] = mask
+    Args:
+        image: Input image in BGR format
+        threshold: Lightness above which pixels count as background
+        fast_mode: Threshold at half resolution, clean the mask at full resolution
     
-    print(f'✅ Background removed (threshold={threshold})')
-    return result, mask
+    Returns:
+        Tuple of (unmasked grayscale image, drawing mask with 255 = drawing)
+    """
+    # Convert to RGB if needed
+    if len(image.shape) == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    
+    # No pre-blur: the morphology below and the median blur in clean_noise absorb noise
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    
+    if fast_mode:
+        # Threshold a quarter of the pixels, then upscale before the morphology:
+        # the kernels are sized for full resolution and would erase thin strokes
+        # if applied to the half-size mask
+        small = downscale(image)
+        small_mask = threshold_background(small, cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), threshold)
+        mask = cv2.resize(small_mask, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_NEAREST)
+        mask = clean_background_mask(mask)
+    else:
+        mask = build_background_mask(image, gray, threshold)
+    
+    log.debug('✅ Background detected (threshold=%s, fast_mode=%s)', threshold, fast_mode)
+    return gray, mask
 
 
 def enhance_contrast(image):
@@ -86,8 +223,7 @@ def enhance_contrast(image):
     
     # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
     # This preserves local contrast better than global histogram equalization
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    enhanced = clahe.apply(gray)
+    enhanced = get_clahe().apply(gray)
     
     return enhanced
 
@@ -97,57 +233,59 @@ def clean_noise(binary_image, min_artifact_size=100):
     Remove small artifacts and noise from binary image.
     Keeps only connected components larger than min_artifact_size pixels.
     """
-    print(f'🧹 Cleaning noise (min_artifact_size={min_artifact_size})')
+    log.debug('🧹 Cleaning noise (min_artifact_size=%s)', min_artifact_size)
     
     # Apply median blur to remove salt-and-pepper noise
     cleaned = cv2.medianBlur(binary_image, 3)
     
     # Find connected components
-    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(cleaned, connectivity=8)
-    
-    # Create output image
-    output = np.zeros_like(cleaned)
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+        cleaned, connectivity=8, ltype=cv2.CV_32S, ccltype=_CCL_ALGORITHM
+    )
     
     # Keep only components larger than min_artifact_size
-    kept_count = 0
-    removed_count = 0
-    for i in range(1, num_labels):  # Skip background (label 0)
-        area = stats[i, cv2.CC_STAT_AREA]
-        if area >= min_artifact_size:
-            output[labels == i] = 255
-            kept_count += 1
-        else:
-            removed_count += 1
+    # (lookup table indexed by label, so the image is scanned once)
+    keep = stats[:, cv2.CC_STAT_AREA] >= min_artifact_size
+    keep[0] = False  # Skip background (label 0)
+    output = np.where(keep[labels], np.uint8(255), np.uint8(0))
     
-    print(f'   Kept {kept_count} components, removed {removed_count} small artifacts')
+    kept_count = int(keep.sum())
+    removed_count = (num_labels - 1) - kept_count
     
-    # Additional morphological cleanup
-    kernel = np.ones((3, 3), np.uint8)
+    log.debug('   Kept %d components, removed %d small artifacts', kept_count, removed_count)
     
+    # Additional morphological cleanup
     # Close small gaps
-    output = cv2.morphologyEx(output, cv2.MORPH_CLOSE, kernel, iterations=1)
+    output = cv2.morphologyEx(output, cv2.MORPH_CLOSE, _KERNEL3, iterations=1)
     
     # Remove tiny remaining noise
-    output = cv2.morphologyEx(output, cv2.MORPH_OPEN, kernel, iterations=1)
+    output = cv2.morphologyEx(output, cv2.MORPH_OPEN, _KERNEL3, iterations=1)
     
     return output
 
 
-def convert_to_bw(image, preserve_style=True):
-    """Convert to black and white with style preservation"""
+def convert_to_bw(image, preserve_style=True, fast_adaptive=False):
+    """
+    Convert to black and white with style preservation.
+    
+    Args:
+        image: Input image (grayscale or BGR)
+        preserve_style: Use adaptive thresholding to keep uneven lines
+        fast_adaptive: Use mean (box filter) instead of Gaussian adaptive threshold
+    """
     if len(image.shape) == 3:
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     else:
         gray = image
     
-    # Apply slight blur to reduce noise before binarization
-    gray = cv2.GaussianBlur(gray, (3, 3), 0)
-    
+    # No pre-blur: the adaptive threshold's block average already low-pass filters
     if preserve_style:
         # Use adaptive thresholding to preserve uneven lines
         # Increased block size (15 instead of 11) for better results
+        # Mean variant uses an O(1) box sum per pixel regardless of block size
+        method = cv2.ADAPTIVE_THRESH_MEAN_C if fast_adaptive else cv2.ADAPTIVE_THRESH_GAUSSIAN_C
         binary = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            gray, 255, method,
             cv2.THRESH_BINARY_INV, 15, 3
         )
     else:
@@ -157,79 +295,113 @@ def convert_to_bw(image, preserve_style=True):
     return binary
 
 
+def trace_with_potracer(binary_image, color, turdsize=15):
+    """
+    Trace binary image in-process using potracer.
+    Emits the same SVG layout as `potrace -s --flat` (10 units per pixel, flipped y axis).
+    
+    Args:
+        binary_image: Binary image (255 = drawing, 0 = background)
+        color: Fill color for paths
+        turdsize: Minimum size of features to keep
+    """
+    height, width = binary_image.shape
+    
+    # potracer inverts its input and traces the False pixels, so pass
+    # the drawing (255) as False
+    bitmap = PotraceBitmap(binary_image <= 127)
+    plist = bitmap.trace(turdsize=turdsize, alphamax=1.0, opticurve=True, opttolerance=0.5)
+    
+    def point(p):
+        return f'{p.x * 10:.0f} {(height - p.y) * 10:.0f}'
+    
+    commands = []
+    for curve in plist:
+        commands.append(f'M{point(curve.start_point)}')
+        for segment in curve:
+            if segment.is_corner:
+                commands.append(f'L{point(segment.c)} {point(segment.end_point)}')
+            else:
+                commands.append(f'C{point(segment.c1)} {point(segment.c2)} {point(segment.end_point)}')
+        commands.append('z')
+    
+    return (
+        '<?xml version="1.0" standalone="no"?>\n'
+        f'<svg version="1.0" xmlns="http://www.w3.org/2000/svg" width="{width}pt" height="{height}pt" '
+        f'viewBox="0 0 {width} {height}" preserveAspectRatio="xMidYMid meet">\n'
+        f'<g transform="translate(0.000000,{height}.000000) scale(0.100000,-0.100000)" '
+        f'fill="{color}" stroke="none">\n'
+        f'<path d="{" ".join(commands)}"/>\n'
+        '</g>\n'
+        '</svg>\n'
+    )
+
+
+def trace_with_potrace_cli(binary_image, color, turdsize=15):
+    """
+    Trace binary image by piping PBM to the potrace executable over stdin.
+    
+    Args:
+        binary_image: Binary image (255 = drawing, 0 = background)
+        color: Fill color for paths
+        turdsize: Minimum size of features to keep
+    """
+    pbm = to_pbm(binary_image)
+    log.debug('   Encoded PBM: %d bytes', len(pbm))
+    
+    # Call potrace reading PBM from stdin and writing SVG to stdout
+    # Increased turdsize to remove more small artifacts
+    cmd = [
+        'potrace',
+        '-s',  # SVG output
+        '--turdsize', str(turdsize),  # Remove small artifacts (bigger = cleaner)
+        '--alphamax', '1.0',  # Corner threshold
+        '--opttolerance', '0.5',  # Slightly higher tolerance for smoother curves
+        '--color', color,  # Color for paths
+        '--flat',  # Flatten paths
+        '-o', '-',  # Write SVG to stdout
+        '-'  # Read bitmap from stdin
+    ]
+    log.debug('   Running potrace with color=%s', color)
+    
+    result = subprocess.run(
+        cmd,
+        input=pbm,
+        check=True,
+        capture_output=True,
+        timeout=30
+    )
+    
+    if result.stderr:
+        log.warning('   Potrace stderr: %s', result.stderr.decode('utf-8', errors='replace'))
+    
+    return result.stdout.decode('utf-8')
+
+
 def vectorize_with_potrace(binary_image, invert_colors=False, turdsize=15):
     """
-    Convert binary image to SVG using Potrace via BMP format.
+    Convert binary image to SVG using Potrace.
+    Runs the potrace CLI, or traces in-process with potracer on hosts without the binary.
     
     Args:
         binary_image: Binary image (255 = drawing, 0 = background)
         invert_colors: If True, output white on transparent; if False, black on transparent
         turdsize: Minimum size of features to keep (higher = cleaner, removes more small artifacts)
     """
-    # Potrace traces black areas (0) and ignores white (255)
-    # Our binary_image has 255 for lines and 0 for background
-    # So we need to INVERT it for potrace!
-    binary_image = 255 - binary_image
-    
     # Get image dimensions
     height, width = binary_image.shape
-    print(f'✏️ Vectorizing image: {width}x{height} (turdsize={turdsize}, invert={invert_colors})')
-    
-    tmp_input_path = None
-    tmp_output_path = None
+    log.debug('✏️ Vectorizing image: %dx%d (turdsize=%s, invert=%s)', width, height, turdsize, invert_colors)
     
     try:
-        # Save as BMP format (potrace supports BMP on all platforms!)
-        with tempfile.NamedTemporaryFile(suffix='.bmp', delete=False) as tmp_input:
-            tmp_input_path = tmp_input.name
-        
-        # Save binary image as BMP using OpenCV
-        success = cv2.imwrite(tmp_input_path, binary_image)
-        if not success:
-            raise Exception('Failed to write BMP file')
-        
-        print(f'   Saved BMP: {os.path.getsize(tmp_input_path)} bytes')
-        
-        # Create temporary SVG output file
-        with tempfile.NamedTemporaryFile(suffix='.svg', delete=False, mode='w', encoding='utf-8') as tmp_output:
-            tmp_output_path = tmp_output.name
-        
         # Choose color based on invert_colors setting
         color = '#FFFFFF' if invert_colors else '#000000'
-        print(f'   🎨 Color setting: invert_colors={invert_colors}, using color={color}')
-        
-        # Call potrace with BMP input
-        # Increased turdsize to remove more small artifacts
-        cmd = [
-            'potrace',
-            tmp_input_path,
-            '-o', tmp_output_path,
-            '-s',  # SVG output
-            '--turdsize', str(turdsize),  # Remove small artifacts (bigger = cleaner)
-            '--alphamax', '1.0',  # Corner threshold
-            '--opttolerance', '0.5',  # Slightly higher tolerance for smoother curves
-            '--color', color,  # Color for paths
-            '--flat'  # Flatten paths
-        ]
-        print(f'   Running potrace with color={color}')
-        
-        result = subprocess.run(
-            cmd, 
-            check=True, 
-            capture_output=True, 
-            text=True, 
-            timeout=30
-        )
+        log.debug('   🎨 Color setting: invert_colors=%s, using color=%s', invert_colors, color)
         
-        if result.stderr:
-            print(f'   Potrace stderr: {result.stderr}')
-        
-        # Read generated SVG
-        if not os.path.exists(tmp_output_path):
-            raise Exception('Potrace did not create output file')
-        
-        with open(tmp_output_path, 'r', encoding='utf-8') as f:
-            svg = f.read()
+        if POTRACER_AVAILABLE and not POTRACE_CLI_AVAILABLE:
+            # There is no binary to fall back to, so potracer errors propagate as they are
+            svg = trace_with_potracer(binary_image, color, turdsize=turdsize)
+        else:
+            svg = trace_with_potrace_cli(binary_image, color, turdsize=turdsize)
         
         if not svg or len(svg) < 50:
             raise Exception(f'Generated SVG is too short or empty: {len(svg)} bytes')
@@ -244,34 +416,23 @@ def vectorize_with_potrace(binary_image, invert_colors=False, turdsize=15):
             # Also handle style attribute
             svg = svg.replace('fill:black', 'fill:#FFFFFF')
             svg = svg.replace('fill:#000000', 'fill:#FFFFFF')
-            print(f'   🔄 Replaced fill colors to white (#FFFFFF)')
+            log.debug('   🔄 Replaced fill colors to white (#FFFFFF)')
         
-        print(f'✅ Generated SVG: {len(svg)} bytes, color: {color}')
+        log.debug('✅ Generated SVG: %d bytes, color: %s', len(svg), color)
         return svg
         
     except subprocess.TimeoutExpired:
         raise Exception('Potrace timeout - image may be too complex')
     except subprocess.CalledProcessError as e:
-        error_msg = e.stderr if e.stderr else (e.stdout if e.stdout else 'Unknown potrace error')
-        print(f'Potrace CalledProcessError: {error_msg}')
+        error_msg = e.stderr if e.stderr else (e.stdout if e.stdout else b'Unknown potrace error')
+        error_msg = error_msg.decode('utf-8', errors='replace')
+        log.error('Potrace CalledProcessError: %s', error_msg)
         raise Exception(f'Potrace failed: {error_msg}')
     except FileNotFoundError:
         raise Exception('Potrace not found. Please install potrace: brew install potrace')
     except Exception as e:
-        print(f'Vectorization error: {str(e)}')
+        log.error('Vectorization error: %s', e)
         raise
-    finally:
-        # Clean up temporary files
-        if tmp_input_path and os.path.exists(tmp_input_path):
-            try:
-                os.unlink(tmp_input_path)
-            except:
-                pass
-        if tmp_output_path and os.path.exists(tmp_output_path):
-            try:
-                os.unlink(tmp_output_path)
-            except:
-                pass
 
 
 @app.route('/health', methods=['GET'])
@@ -282,26 +443,19 @@ def health():
     }), 200
 
 
-def apply_user_mask_to_binary(binary_image, mask_image, image_size):
+def prepare_user_mask(mask_image, image_size):
     """
-    Apply user-drawn mask to binary image AFTER binarization.
-    This removes the masked areas from the final binary image without creating edge artifacts.
+    Build the exclusion mask from a user-drawn mask.
+    Independent of the image pipeline, so it can run while the image is being binarized.
     
     Args:
-        binary_image: Binary image (255 = drawing, 0 = background)
         mask_image: User mask image (RGBA, red areas indicate exclusion)
         image_size: Tuple of (width, height) for resizing mask
     
     Returns:
-        Binary image with masked areas set to 0 (removed)
+        Exclusion mask (1 = excluded, 0 = kept)
     """
-    print('🎭 Applying user mask to binary image...')
-    
-    # Resize mask to match image dimensions
-    mask_resized = mask_image.resize(image_size, Image.Resampling.LANCZOS)
-    
-    # Convert mask to numpy array
-    mask_array = np.array(mask_resized)
+    mask_array = np.asarray(mask_image)
     
     # Get alpha channel (areas with alpha > 0 are masked)
     if len(mask_array.shape) == 3 and mask_array.shape[2] >= 4:
@@ -312,32 +466,55 @@ def apply_user_mask_to_binary(binary_image, mask_image, image_size):
     else:
         alpha = mask_array
     
+    # Resize only the channel we need to match image dimensions
+    # (bilinear is enough for a soft mask that gets thresholded next)
+    alpha = cv2.resize(alpha, image_size, interpolation=cv2.INTER_LINEAR)
+    
     # Create exclusion mask (areas where alpha > 50 should be excluded)
     # Use threshold to avoid partial transparency issues
-    exclusion_mask = (alpha > 50).astype(np.uint8) * 255
+    exclusion_mask = (alpha > 50).astype(np.uint8)
     
     # Dilate the exclusion mask slightly to ensure complete removal of edge artifacts
-    kernel = np.ones((5, 5), np.uint8)
-    exclusion_mask = cv2.dilate(exclusion_mask, kernel, iterations=2)
+    # (same as 5x5 dilate with 2 iterations)
+    return cv2.dilate(exclusion_mask, _KERNEL9)
+
+
+def apply_masks_to_binary(binary_image, background_mask, exclusion_mask=None):
+    """
+    Apply background mask and user-drawn mask to binary image AFTER binarization.
+    Both masks are combined first so the binary image is written in a single pass,
+    without creating edge artifacts.
     
-    # Apply mask - set excluded areas to 0 (background) in binary image
-    result = binary_image.copy()
-    result[exclusion_mask > 0] = 0  # Remove masked areas
+    Args:
+        binary_image: Binary image (255 = drawing, 0 = background)
+        background_mask: Drawing mask from detect_background (0 = background)
+        exclusion_mask: Optional exclusion mask from prepare_user_mask (1 = excluded)
     
-    # Count excluded pixels
-    excluded_pixels = np.sum(exclusion_mask > 0)
-    total_pixels = exclusion_mask.shape[0] * exclusion_mask.shape[1]
-    excluded_percent = (excluded_pixels / total_pixels) * 100
+    Returns:
+        The same binary image, modified in place, with background and masked areas set to 0 (removed)
+    """
+    excluded = background_mask == 0
     
-    print(f'   Excluded {excluded_percent:.1f}% of binary image ({excluded_pixels} pixels)')
+    if exclusion_mask is not None:
+        log.debug('🎭 Applying user mask to binary image...')
+        np.logical_or(excluded, exclusion_mask, out=excluded)
+        
+        # Count excluded pixels
+        excluded_pixels = cv2.countNonZero(exclusion_mask)
+        total_pixels = exclusion_mask.size
+        excluded_percent = (excluded_pixels / total_pixels) * 100
+        
+        log.debug('   Excluded %.1f%% of binary image (%d pixels)', excluded_percent, excluded_pixels)
     
-    return result
+    # Set background and excluded areas to 0 in place (binary image is not reused upstream)
+    np.copyto(binary_image, 0, where=excluded)
+    return binary_image
 
 
 @app.route('/process', methods=['POST'])
 def process_image():
     try:
-        print('🎨 Processing request received')
+        log.debug('🎨 Processing request received')
         
         if 'image' not in request.files:
             return jsonify({
@@ -364,12 +541,9 @@ def process_image():
         has_mask = mask_file is not None and mask_file.filename != ''
         
         # Parse options from form data
-        invert_colors = request.form.get('invertColors', 'false').lower() == 'true'
-        min_artifact_size = int(request.form.get('minArtifactSize', '100'))
-        preserve_style = request.form.get('preserveStyle', 'true').lower() == 'true'
-        turdsize = int(request.form.get('turdsize', '15'))
+        options = ProcessOptions.from_form(request.form)
         
-        print(f'⚙️ Options: invertColors={invert_colors}, minArtifactSize={min_artifact_size}, preserveStyle={preserve_style}, turdsize={turdsize}, hasMask={has_mask}')
+        log.debug('⚙️ Options: %s, hasMask=%s', options, has_mask)
         
         # Read image
         file_bytes = file.read()
@@ -379,29 +553,31 @@ def process_image():
                 'error': f'File too large. Maximum size: {MAX_FILE_SIZE / 1024 / 1024}MB'
             }), 400
         
-        print(f'📁 File: {file.filename}, size: {len(file_bytes)} bytes')
+        log.debug('📁 File: %s, size: %d bytes', file.filename, len(file_bytes))
         
-        # Convert to PIL Image
-        pil_image = Image.open(io.BytesIO(file_bytes))
-        original_size = pil_image.size
+        # Decode straight to BGR (no PIL decode + RGB->BGR copy)
+        # Orientation is ignored to match the previous PIL-based decoding
+        cv_image = cv2.imdecode(
+            np.frombuffer(file_bytes, np.uint8),
+            cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+        )
+        if cv_image is None:
+            raise Exception('Failed to decode image')
+        original_size = (cv_image.shape[1], cv_image.shape[0])
         
         # Load mask if provided
         pil_mask = None
         if has_mask:
             mask_bytes = mask_file.read()
             pil_mask = Image.open(io.BytesIO(mask_bytes))
-            print(f'🎭 Mask loaded: {pil_mask.size}, mode: {pil_mask.mode}')
+            log.debug('🎭 Mask loaded: %s, mode: %s', pil_mask.size, pil_mask.mode)
             # Convert mask to RGBA if not already
             if pil_mask.mode != 'RGBA':
                 pil_mask = pil_mask.convert('RGBA')
         
-        # Convert to RGB if needed (handles RGBA, palette images, etc.)
-        if pil_image.mode != 'RGB':
-            pil_image = pil_image.convert('RGB')
-        
         # Resize image if too large (max 1000px on longest side)
         MAX_DIMENSION = 1000
-        width, height = pil_image.size
+        width, height = original_size
         if width > MAX_DIMENSION or height > MAX_DIMENSION:
             if width > height:
                 new_width = MAX_DIMENSION
@@ -409,44 +585,48 @@ def process_image():
             else:
                 new_height = MAX_DIMENSION
                 new_width = int(width * (MAX_DIMENSION / height))
-            pil_image = pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            print(f'📐 Resized: {width}x{height} → {new_width}x{new_height}')
+            cv_image = cv2.resize(cv_image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+            log.debug('📐 Resized: %dx%d → %dx%d', width, height, new_width, new_height)
         
-        # Convert to OpenCV format (BGR)
-        cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+        image_size = (cv_image.shape[1], cv_image.shape[0])
         
-        # Step 1: Remove background (more aggressive)
-        print('🔧 Step 1: Removing background...')
-        processed_image, mask = remove_background(cv_image, threshold=220)
+        # Prepare the user mask in the background while steps 1-3 run
+        # (OpenCV releases the GIL, so both threads make progress)
+        exclusion_future = None
+        if pil_mask and PARALLEL_STAGES:
+            exclusion_future = _STAGE_POOL.submit(prepare_user_mask, pil_mask, image_size)
         
-        # Extract BGR from BGRA if needed
-        if len(processed_image.shape) == 4:
-            bgr_image = processed_image[:, :, :3]
-        else:
-            bgr_image = processed_image
+        # Step 1: Detect background (more aggressive), applied to the binary image in step 4
+        log.debug('🔧 Step 1: Detecting background...')
+        gray_image, mask = detect_background(cv_image, threshold=220, fast_mode=options.fast_mode)
         
         # Step 2: Enhance contrast
-        print('🔧 Step 2: Enhancing contrast...')
-        enhanced = enhance_contrast(bgr_image)
+        log.debug('🔧 Step 2: Enhancing contrast...')
+        enhanced = enhance_contrast(gray_image)
         
         # Step 3: Convert to black and white
-        print('🔧 Step 3: Converting to B&W...')
-        bw_image = convert_to_bw(enhanced, preserve_style=preserve_style)
+        log.debug('🔧 Step 3: Converting to B&W...')
+        bw_image = convert_to_bw(enhanced, preserve_style=options.preserve_style, fast_adaptive=options.fast_adaptive)
         
-        # Step 4: Apply user mask AFTER binarization (to avoid edge artifacts)
+        # Step 4: Apply background and user masks AFTER binarization (to avoid edge artifacts)
+        log.debug('🔧 Step 4: Applying masks...')
+        exclusion_mask = None
         if pil_mask:
-            print('🔧 Step 4a: Applying user mask...')
-            bw_image = apply_user_mask_to_binary(bw_image, pil_mask, pil_image.size)
+            if exclusion_future is not None:
+                exclusion_mask = exclusion_future.result()
+            else:
+                exclusion_mask = prepare_user_mask(pil_mask, image_size)
+        bw_image = apply_masks_to_binary(bw_image, mask, exclusion_mask)
         
         # Step 5: Clean noise and remove artifacts
-        print('🔧 Step 5: Cleaning noise...')
-        cleaned_image = clean_noise(bw_image, min_artifact_size=min_artifact_size)
+        log.debug('🔧 Step 5: Cleaning noise...')
+        cleaned_image = clean_noise(bw_image, min_artifact_size=options.min_artifact_size)
         
         # Step 6: Vectorize
-        print('🔧 Step 6: Vectorizing...')
-        svg = vectorize_with_potrace(cleaned_image, invert_colors=invert_colors, turdsize=turdsize)
+        log.debug('🔧 Step 6: Vectorizing...')
+        svg = vectorize_with_potrace(cleaned_image, invert_colors=options.invert_colors, turdsize=options.turdsize)
         
-        print('✅ Processing completed successfully!')
+        log.debug('✅ Processing completed successfully!')
         
         return jsonify({
             'success': True,
@@ -456,18 +636,13 @@ def process_image():
                 'height': original_size[1]
             },
             'options': {
-                'invertColors': invert_colors,
-                'minArtifactSize': min_artifact_size,
-                'preserveStyle': preserve_style,
-                'turdsize': turdsize,
+                **options.to_dict(),
                 'maskApplied': has_mask
             }
         }), 200
         
     except Exception as e:
-        print(f'🚨 Error processing image: {str(e)}')
-        import traceback
-        traceback.print_exc()
+        log.exception('🚨 Error processing image: %s', e)
         return jsonify({
             'success': False,
             'error': 'Failed to process image',
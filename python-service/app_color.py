@@ -138,10 +138,11 @@ def process_image():
         # ===== PIPELINE STAGE 2: Color Cleanup =====
         print(f'🎨 Stage 2: Color cleanup (extracting {color_count} colors)...')
         stage2_start = time.time()
-        color_palette, color_flattened = create_color_map(
+        color_palette, color_flattened, color_labels = create_color_map(
             bgr_image,
             mask,
-            n_colors=color_count
+            n_colors=color_count,
+            return_labels=True
         )
         print(f'✅ Stage 2 completed in {time.time() - stage2_start:.2f}s, found {len(color_palette)} colors')
         
@@ -159,7 +160,8 @@ def process_image():
             color_flattened,
             mask,
             color_palette,
-            preserve_style=preserve_style
+            preserve_style=preserve_style,
+            labels=color_labels
         )
         print(f'✅ Stage 3 completed in {time.time() - stage3_start:.2f}s, found {len(color_regions)} regions')
         
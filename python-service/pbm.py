@@ -0,0 +1,15 @@
+"""
+PBM encoding shared by the potrace callers (app.py and pipeline/vectorization.py).
+"""
+
+import numpy as np
+
+
+def to_pbm(binary_image):
+    """
+    Encode binary image as raw PBM (P4, 1 bit per pixel).
+    PBM 1 = black, which potrace traces, so drawing pixels (255) map to 1 without inverting.
+    """
+    height, width = binary_image.shape
+    header = b'P4\n%d %d\n' % (width, height)
+    return header + np.packbits(binary_image > 127, axis=1).tobytes()
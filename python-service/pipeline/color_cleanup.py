@@ -7,18 +7,30 @@ Stage 2: Color Cleanup
 
 import cv2
 import numpy as np
-from sklearn.cluster import KMeans
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 import colorsys
+from dataclasses import dataclass
 
 
+# Label value for pixels outside the drawing mask in flatten_colors label maps
+NO_LABEL = 255
+
+# K-means is fitted on a copy of the image downscaled to this long edge;
+# centroids for a handful of colors don't change with more samples
+KMEANS_MAX_SIDE = 512
+
+
+@dataclass(slots=True, eq=False)
 class ColorInfo:
     """Information about a color in the palette."""
-    def __init__(self, rgb: Tuple[int, int, int], count: int, percentage: float):
-        self.rgb = rgb
-        self.count = count
-        self.percentage = percentage
-        self.hex = f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
+    rgb: Tuple[int, int, int]
+    count: int
+    percentage: float
+    
+    @property
+    def hex(self) -> str:
+        r, g, b = self.rgb
+        return f"#{r:02x}{g:02x}{b:02x}"
     
     def to_dict(self) -> Dict:
         return {
@@ -32,7 +44,8 @@ def extract_dominant_colors(
     image: np.ndarray,
     mask: np.ndarray,
     n_colors: int = 5,
-    min_color_percentage: float = 2.0
+    min_color_percentage: float = 2.0,
+    mask_bool: Optional[np.ndarray] = None
 ) -> Tuple[List[ColorInfo], np.ndarray]:
     """
     Extract dominant colors from image using K-means clustering.
@@ -42,6 +55,7 @@ def extract_dominant_colors(
         mask: Mask indicating drawing area (255 = drawing, 0 = background)
         n_colors: Number of colors to extract (3-7)
         min_color_percentage: Minimum percentage to include a color
+        mask_bool: Precomputed mask > 128, to avoid recomputing it
         
     Returns:
         Tuple of (color_info_list, color_mapped_image)
@@ -50,7 +64,8 @@ def extract_dominant_colors(
     n_colors = max(3, min(7, n_colors))
     
     # Extract pixels from drawing area only
-    mask_bool = mask > 128  # Convert to boolean mask
+    if mask_bool is None:
+        mask_bool = mask > 128  # Convert to boolean mask
     pixels = image[mask_bool]
     
     print(f'📊 Extracting colors: {len(pixels)} pixels in drawing area')
@@ -67,31 +82,59 @@ def extract_dominant_colors(
     # Reshape pixels for K-means (flatten to list of BGR values)
     pixels_reshaped = pixels.reshape(-1, 3)
     
-    print(f'🎨 Running K-means clustering for {n_colors} colors...')
+    # Fit on a downscaled copy; labels are assigned at full resolution below
+    # Nearest-neighbour subsampling keeps real pixel colors (area averaging
+    # would blend stroke edges with the background and pull centers to gray)
+    samples = pixels_reshaped
+    scale = KMEANS_MAX_SIDE / max(image.shape[:2])
+    if scale < 1.0:
+        # Explicit size so the short side of elongated images never rounds to 0
+        height, width = image.shape[:2]
+        small_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        small = cv2.resize(image, small_size, interpolation=cv2.INTER_NEAREST)
+        small_mask = cv2.resize(mask, small_size, interpolation=cv2.INTER_NEAREST)
+        small_pixels = small[small_mask > 128]
+        # Very sparse masks can vanish when downscaled; keep full resolution then
+        if len(small_pixels) >= n_colors:
+            samples = small_pixels
+    
+    print(f'🎨 Running K-means clustering for {n_colors} colors on {len(samples)} pixels...')
     
     try:
         # Use K-means clustering in BGR space
         # Note: LAB space would be better perceptually, but BGR is simpler
-        kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10, max_iter=300)
-        kmeans.fit(pixels_reshaped)
+        # OpenCV's k-means runs the whole loop in C++; 3 k-means++ attempts are plenty in 3D
+        cv2.setRNGSeed(42)
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1.0)
+        _, labels, centers = cv2.kmeans(
+            samples.astype(np.float32), n_colors, None,
+            criteria, 3, cv2.KMEANS_PP_CENTERS
+        )
         print('✅ K-means clustering completed')
     except Exception as e:
         print(f'🚨 K-means clustering failed: {e}')
         raise
     
     # Get cluster centers (dominant colors)
-    colors_bgr = kmeans.cluster_centers_.astype(np.uint8)
+    colors_bgr = np.clip(centers, 0, 255).astype(np.uint8)
+    
+    # Label full-resolution pixels with the learned centers
+    # Exact nearest-center assignment (one GEMM) rather than the quantized
+    # LUT, since these labels drive the counts behind min_color_percentage
+    if samples is pixels_reshaped:
+        labels = labels.ravel()
+    else:
+        labels = nearest_palette_indices(pixels_reshaped.astype(np.float32), centers)
     
     # Count pixels per cluster
-    labels = kmeans.labels_
-    unique, counts = np.unique(labels, return_counts=True)
+    counts = np.bincount(labels, minlength=n_colors)
     
     total_pixels = len(pixels_reshaped)
     
     # Create ColorInfo objects
     color_info_list = []
     for i, color_bgr in enumerate(colors_bgr):
-        count = int(counts[i]) if i < len(counts) else 0
+        count = int(counts[i])
         percentage = (count / total_pixels) * 100
         
         # Filter out colors below minimum percentage
@@ -105,25 +148,81 @@ def extract_dominant_colors(
     
     # Create color-mapped image
     # Map each pixel to nearest cluster center
-    color_mapped = np.zeros_like(image)
-    
-    # For pixels in mask, assign cluster color
-    for i in range(len(pixels_reshaped)):
-        label = labels[i]
-        if label < len(colors_bgr):
-            color_mapped[mask_bool][i] = colors_bgr[label]
+    # Every pixel is written by one of the two fills below, so skip zeroing
+    color_mapped = np.empty_like(image)
     
     # Keep background transparent/white
-    color_mapped[~mask_bool] = [255, 255, 255]  # White background
+    color_mapped[~mask_bool] = 255  # White background
+    
+    # For pixels in mask, assign cluster color (single vectorized gather)
+    color_mapped[mask_bool] = colors_bgr[labels]
     
     return color_info_list, color_mapped
 
 
+def nearest_palette_indices(pixels: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """
+    Find the nearest palette color for each pixel (squared Euclidean distance).
+    Uses ||x - p||^2 = ||x||^2 + ||p||^2 - 2 x.p so the heavy part is one matrix product;
+    ||x||^2 is the same for every palette entry and sqrt is monotonic, so both are skipped.
+    
+    Args:
+        pixels: Array of shape (N, 3), float32
+        palette: Array of shape (K, 3), float32
+        
+    Returns:
+        Array of shape (N,) with palette indices
+    """
+    palette_sq = (palette * palette).sum(axis=1)
+    distances = palette_sq[np.newaxis, :] - 2.0 * (pixels @ palette.T)
+    return np.argmin(distances, axis=1)
+
+
+def build_palette_lut(palette: np.ndarray, bits: int = 5) -> np.ndarray:
+    """
+    Precompute nearest palette index for every quantized BGR value.
+    With 5 bits per channel the table has 32^3 entries (32KB) and fits in L1 cache.
+    
+    Args:
+        palette: Array of shape (K, 3), float32, BGR
+        bits: Bits kept per channel
+        
+    Returns:
+        Flat uint8 array of shape (2^(3*bits),) indexed by quantized BGR
+    """
+    levels = 1 << bits
+    step = 256 // levels
+    # Use the center of each quantization cell
+    values = np.arange(levels, dtype=np.float32) * step + (step - 1) / 2.0
+    grid = np.stack(np.meshgrid(values, values, values, indexing='ij'), axis=-1).reshape(-1, 3)
+    return nearest_palette_indices(grid, palette).astype(np.uint8)
+
+
+def apply_palette_lut(pixels: np.ndarray, lut: np.ndarray, bits: int = 5) -> np.ndarray:
+    """
+    Map uint8 BGR pixels to palette indices using a table from build_palette_lut.
+    
+    Args:
+        pixels: Array of shape (..., 3), uint8, BGR
+        lut: Flat lookup table from build_palette_lut
+        bits: Bits kept per channel (must match the table)
+        
+    Returns:
+        Array of shape (...) with palette indices
+    """
+    shift = 8 - bits
+    quantized = (pixels >> shift).astype(np.intp)
+    index = (quantized[..., 0] << (2 * bits)) | (quantized[..., 1] << bits) | quantized[..., 2]
+    return lut[index]
+
+
 def flatten_colors(
     image: np.ndarray,
     mask: np.ndarray,
-    color_palette: List[ColorInfo]
-) -> np.ndarray:
+    color_palette: List[ColorInfo],
+    return_labels: bool = False,
+    mask_bool: Optional[np.ndarray] = None
+):
     """
     Flatten image colors to palette colors.
     Maps each pixel to nearest palette color.
@@ -132,12 +231,18 @@ def flatten_colors(
         image: Input image in BGR format
         mask: Mask indicating drawing area
         color_palette: List of ColorInfo objects
+        return_labels: Also return the per-pixel palette index map
+        mask_bool: Precomputed mask > 128, to avoid recomputing it
         
     Returns:
-        Color-flattened image
+        Color-flattened image, or tuple of (flattened_image, label_image)
+        when return_labels is set. label_image holds the palette index of
+        each pixel and NO_LABEL outside the drawing mask.
     """
+    labels = np.full(image.shape[:2], NO_LABEL, dtype=np.uint8)
+    
     if not color_palette:
-        return image.copy()
+        return (image.copy(), labels) if return_labels else image.copy()
     
     # Convert palette colors to BGR numpy array
     palette_bgr = np.array([
@@ -149,24 +254,22 @@ def flatten_colors(
     result = image.copy()
     
     # Only process pixels in mask
-    mask_bool = mask > 128
+    if mask_bool is None:
+        mask_bool = mask > 128
     pixels = image[mask_bool]
     
     if len(pixels) == 0:
-        return result
-    
-    # Find nearest palette color for each pixel
-    pixels_float = pixels.astype(np.float32).reshape(-1, 3)
+        return (result, labels) if return_labels else result
     
-    # Calculate distances to all palette colors
-    distances = np.sqrt(((pixels_float[:, np.newaxis, :] - palette_bgr[np.newaxis, :, :]) ** 2).sum(axis=2))
-    
-    # Find nearest color index
-    nearest_indices = np.argmin(distances, axis=1)
+    # Find nearest palette color for each pixel with one table lookup
+    nearest_indices = apply_palette_lut(pixels, build_palette_lut(palette_bgr))
     
     # Assign palette colors
-    flattened_pixels = palette_bgr[nearest_indices].astype(np.uint8)
-    result[mask_bool] = flattened_pixels
+    result[mask_bool] = palette_bgr.astype(np.uint8)[nearest_indices]
+    
+    if return_labels:
+        labels[mask_bool] = nearest_indices
+        return result, labels
     
     return result
 
@@ -174,8 +277,9 @@ def flatten_colors(
 def create_color_map(
     image: np.ndarray,
     mask: np.ndarray,
-    n_colors: int = 5
-) -> Tuple[List[ColorInfo], np.ndarray]:
+    n_colors: int = 5,
+    return_labels: bool = False
+):
     """
     Complete color cleanup pipeline.
     
@@ -183,17 +287,28 @@ def create_color_map(
         image: Input image in BGR format
         mask: Mask indicating drawing area
         n_colors: Number of colors to extract
+        return_labels: Also return the per-pixel palette index map
         
     Returns:
-        Tuple of (color_info_list, color_flattened_image)
+        Tuple of (color_info_list, color_flattened_image), with the
+        label image appended when return_labels is set
     """
+    # Boolean drawing mask shared by both steps
+    mask_bool = mask > 128
+    
     # Extract dominant colors
     color_info_list, color_mapped = extract_dominant_colors(
-        image, mask, n_colors=n_colors
+        image, mask, n_colors=n_colors, mask_bool=mask_bool
     )
     
     # Flatten colors to palette
-    flattened = flatten_colors(image, mask, color_info_list)
+    if return_labels:
+        flattened, labels = flatten_colors(
+            image, mask, color_info_list, return_labels=True, mask_bool=mask_bool
+        )
+        return color_info_list, flattened, labels
+    
+    flattened = flatten_colors(image, mask, color_info_list, mask_bool=mask_bool)
     
     return color_info_list, flattened
 
@@ -6,25 +6,257 @@ Stage 5: SVG Post-Processing
 """
 
 import re
-from typing import Dict, List
+import numpy as np
+from typing import Dict, List, Optional, Tuple
 from .color_cleanup import ColorInfo
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
-def optimize_svg_paths(svg_content: str, reduction_percent: float = 0.15) -> str:
+
+# Path data attribute and its tokens (command letters and numbers)
+_PATH_D_RE = re.compile(r'(<path\b[^>]*?\sd=")([^"]*)(")', re.IGNORECASE)
+_PATH_TOKEN_RE = re.compile(r'[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+
+def _rdp_keep(points, eps2):
+    """
+    Ramer-Douglas-Peucker over a polyline, iterative with an explicit stack.
+    Distances are compared squared against eps2, so no sqrt per point.
+    
+    Args:
+        points: Array of shape (N, 2), float64
+        eps2: Squared distance tolerance
+        
+    Returns:
+        Boolean array of shape (N,), True for points to keep
+    """
+    n = points.shape[0]
+    keep = np.zeros(n, dtype=np.bool_)
+    keep[0] = True
+    keep[n - 1] = True
+    
+    # Intervals on the stack never overlap, so n pairs is enough
+    stack = np.empty((n, 2), dtype=np.int64)
+    stack[0, 0] = 0
+    stack[0, 1] = n - 1
+    top = 1
+    
+    while top > 0:
+        top -= 1
+        lo = stack[top, 0]
+        hi = stack[top, 1]
+        
+        ax = points[lo, 0]
+        ay = points[lo, 1]
+        dx = points[hi, 0] - ax
+        dy = points[hi, 1] - ay
+        seg2 = dx * dx + dy * dy
+        
+        dmax = 0.0
+        index = -1
+        for i in range(lo + 1, hi):
+            px = points[i, 0] - ax
+            py = points[i, 1] - ay
+            if seg2 > 0.0:
+                cross = dx * py - dy * px
+                d2 = cross * cross / seg2
+            else:
+                d2 = px * px + py * py
+            if d2 > dmax:
+                dmax = d2
+                index = i
+        
+        if dmax > eps2:
+            keep[index] = True
+            stack[top, 0] = lo
+            stack[top, 1] = index
+            stack[top + 1, 0] = index
+            stack[top + 1, 1] = hi
+            top += 2
+    
+    return keep
+
+
+if NUMBA_AVAILABLE:
+    _rdp_keep = njit(cache=True)(_rdp_keep)
+
+
+def _parse_path_data(d: str) -> Optional[List[Tuple[str, Tuple[float, ...]]]]:
+    """
+    Parse path data into absolute segments: ('M', (x, y)), ('L', (x, y)),
+    ('C', (x1, y1, x2, y2, x, y)) and ('Z', ()).
+    Only the commands Potrace emits are supported; returns None otherwise.
+    """
+    tokens = _PATH_TOKEN_RE.findall(d)
+    segments = []
+    cx = cy = sx = sy = 0.0
+    cmd = None
+    i = 0
+    
+    while i < len(tokens):
+        token = tokens[i]
+        if token.isalpha():
+            cmd = token
+            i += 1
+            if cmd in 'Zz':
+                segments.append(('Z', ()))
+                cx, cy = sx, sy
+            elif cmd not in 'MmLlCc':
+                return None
+            continue
+        
+        if cmd is None or cmd in 'Zz':
+            return None
+        
+        count = 6 if cmd in 'Cc' else 2
+        if i + count > len(tokens) or any(t.isalpha() for t in tokens[i:i + count]):
+            return None
+        values = [float(t) for t in tokens[i:i + count]]
+        i += count
+        
+        if cmd.islower():
+            values = [v + (cx if k % 2 == 0 else cy) for k, v in enumerate(values)]
+        
+        if cmd in 'Mm':
+            segments.append(('M', (values[0], values[1])))
+            sx, sy = values[0], values[1]
+            # Extra coordinate pairs after a moveto are implicit linetos
+            cmd = 'l' if cmd == 'm' else 'L'
+        elif cmd in 'Ll':
+            segments.append(('L', tuple(values)))
+        else:
+            segments.append(('C', tuple(values)))
+        cx, cy = values[-2], values[-1]
+    
+    return segments
+
+
+def _format_number(value: float) -> str:
+    """Format a coordinate compactly (integers without a decimal point)."""
+    value = round(value, 3)
+    if value == int(value):
+        return str(int(value))
+    return f'{value:.3f}'.rstrip('0')
+
+
+def _format_path_data(segments: List[Tuple[str, Tuple[float, ...]]]) -> str:
+    """
+    Write segments back as relative path data like Potrace does
+    (absolute first moveto, command letter only when it changes).
+    """
+    parts = []
+    cx = cy = sx = sy = 0.0
+    last = None
+    
+    for kind, values in segments:
+        if kind == 'Z':
+            parts.append('z')
+            cx, cy = sx, sy
+            last = 'z'
+            continue
+        
+        if kind == 'M' and not parts:
+            letter, offset = 'M', (0.0, 0.0)
+        else:
+            letter, offset = kind.lower(), (cx, cy)
+        
+        numbers = ' '.join(
+            _format_number(v - offset[k % 2]) for k, v in enumerate(values)
+        )
+        # A repeated m would be read as a lineto, so always spell out moveto
+        parts.append(numbers if letter == last and letter != 'm' else letter + numbers)
+        last = letter
+        
+        cx, cy = values[-2], values[-1]
+        if kind == 'M':
+            sx, sy = cx, cy
+    
+    return ' '.join(parts)
+
+
+def simplify_path_data(d: str, tolerance: float) -> str:
+    """
+    Simplify straight-line runs in SVG path data with Douglas-Peucker.
+    Curves are left untouched so hand-drawn shapes keep their character.
+    
+    Args:
+        d: Path data string
+        tolerance: Allowed deviation in path units (Potrace writes 10 units per pixel)
+        
+    Returns:
+        Simplified path data, or the input unchanged if nothing was removed
+    """
+    segments = _parse_path_data(d)
+    if not segments:
+        return d
+    
+    simplified = []
+    removed = 0
+    current = (0.0, 0.0)
+    start = (0.0, 0.0)
+    i = 0
+    
+    while i < len(segments):
+        kind, values = segments[i]
+        
+        if kind == 'L':
+            # Collect the whole run of consecutive line segments
+            j = i
+            while j < len(segments) and segments[j][0] == 'L':
+                j += 1
+            run = np.array([current] + [segments[k][1] for k in range(i, j)], dtype=np.float64)
+            
+            if len(run) >= 3:
+                keep = _rdp_keep(run, tolerance * tolerance)
+                removed += int(len(run) - keep.sum())
+                simplified.extend(('L', (p[0], p[1])) for p in run[1:][keep[1:]])
+            else:
+                simplified.extend(segments[i:j])
+            
+            current = segments[j - 1][1]
+            i = j
+            continue
+        
+        simplified.append((kind, values))
+        if kind == 'M':
+            current = start = values
+        elif kind == 'C':
+            current = values[-2:]
+        else:
+            current = start
+        i += 1
+    
+    if removed == 0:
+        return d
+    
+    return _format_path_data(simplified)
+
+
+def optimize_svg_paths(svg_content: str, tolerance: float = 5.0) -> str:
     """
     Slightly optimize SVG paths by reducing points.
     Keeps shape accuracy while reducing file size.
     
     Args:
         svg_content: SVG string
-        reduction_percent: Percentage of points to remove (0.0-0.3)
+        tolerance: Douglas-Peucker tolerance in path units; the default of 5
+            is half a pixel in Potrace's 10-units-per-pixel coordinates, so
+            only points that sit almost on a straight line are dropped
         
     Returns:
         Optimized SVG string
     """
-    # For MVP, we'll keep paths as-is to preserve style
-    # Future: Implement Douglas-Peucker algorithm for path simplification
-    return svg_content
+    if tolerance <= 0:
+        return svg_content
+    
+    return _PATH_D_RE.sub(
+        lambda m: m.group(1) + simplify_path_data(m.group(2), tolerance) + m.group(3),
+        svg_content
+    )
 
 
 def add_metadata(
@@ -106,7 +338,7 @@ def postprocess_svg(
         Post-processed SVG
     """
     # Optimize paths (minimal for style preservation)
-    optimized = optimize_svg_paths(svg_content, reduction_percent=0.1)
+    optimized = optimize_svg_paths(svg_content)
     
     # Organize layers
     organized = organize_svg_layers(optimized)
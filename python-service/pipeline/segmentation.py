@@ -7,31 +7,45 @@ Stage 3: Color-Based Segmentation
 
 import cv2
 import numpy as np
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 from .color_cleanup import ColorInfo
 
 
+# Structuring elements shared by all regions
+_KERNEL2 = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+_KERNEL3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+
+def mask_stats(mask: np.ndarray) -> Tuple[int, int, int, int, int]:
+    """
+    Compute foreground area and bounding box of a binary mask.
+    
+    Args:
+        mask: Binary mask (255 = foreground, 0 = background)
+        
+    Returns:
+        Tuple of (area, x, y, width, height); the box is all zeros for an empty mask
+    """
+    x, y, w, h = cv2.boundingRect(mask)
+    return cv2.countNonZero(mask), x, y, w, h
+
+
 class ColorRegion:
     """Represents a color region in the image."""
     def __init__(self, color_info: ColorInfo, mask: np.ndarray):
         self.color_info = color_info
         self.mask = mask
-        self.bounds = self._calculate_bounds()
+        self.area, self.bounds = self._calculate_stats()
     
-    def _calculate_bounds(self) -> Dict:
-        """Calculate bounding box of the region."""
-        coords = np.where(self.mask > 128)
-        if len(coords[0]) == 0:
-            return {"x": 0, "y": 0, "width": 0, "height": 0}
+    def _calculate_stats(self) -> Tuple[int, Dict]:
+        """Calculate foreground area and bounding box of the region."""
+        area, x, y, w, h = mask_stats(self.mask)
         
-        y_min, y_max = coords[0].min(), coords[0].max()
-        x_min, x_max = coords[1].min(), coords[1].max()
-        
-        return {
-            "x": int(x_min),
-            "y": int(y_min),
-            "width": int(x_max - x_min + 1),
-            "height": int(y_max - y_min + 1)
+        return area, {
+            "x": int(x),
+            "y": int(y),
+            "width": int(w),
+            "height": int(h)
         }
 
 
@@ -39,7 +53,8 @@ def extract_color_regions(
     image: np.ndarray,
     mask: np.ndarray,
     color_palette: List[ColorInfo],
-    tolerance: int = 10
+    tolerance: int = 10,
+    labels: Optional[np.ndarray] = None
 ) -> List[ColorRegion]:
     """
     Extract separate masks for each color region.
@@ -49,6 +64,9 @@ def extract_color_regions(
         mask: Overall drawing mask
         color_palette: List of ColorInfo objects
         tolerance: Color matching tolerance (0-255)
+        labels: Optional palette index map from flatten_colors. When given,
+            each color mask is read straight from it instead of re-matching
+            the image colors.
         
     Returns:
         List of ColorRegion objects
@@ -56,38 +74,40 @@ def extract_color_regions(
     regions = []
     
     # Convert palette colors to BGR
-    for color_info in color_palette:
-        # RGB to BGR
-        target_bgr = np.array([
-            color_info.rgb[2],
-            color_info.rgb[1],
-            color_info.rgb[0]
-        ], dtype=np.uint8)
-        
-        # Create mask for this color
-        # Use color matching with tolerance
-        lower_bound = np.maximum(target_bgr - tolerance, 0)
-        upper_bound = np.minimum(target_bgr + tolerance, 255)
-        
-        color_mask = cv2.inRange(image, lower_bound, upper_bound)
-        
-        # Intersect with overall drawing mask
-        color_mask = cv2.bitwise_and(color_mask, mask)
+    for index, color_info in enumerate(color_palette):
+        if labels is not None:
+            # Label map is already restricted to the drawing mask
+            color_mask = np.where(labels == index, np.uint8(255), np.uint8(0))
+        else:
+            # RGB to BGR
+            target_bgr = np.array([
+                color_info.rgb[2],
+                color_info.rgb[1],
+                color_info.rgb[0]
+            ], dtype=np.uint8)
+            
+            # Create mask for this color
+            # Use color matching with tolerance
+            lower_bound = np.maximum(target_bgr - tolerance, 0)
+            upper_bound = np.minimum(target_bgr + tolerance, 255)
+            
+            color_mask = cv2.inRange(image, lower_bound, upper_bound)
+            
+            # Intersect with overall drawing mask
+            color_mask = cv2.bitwise_and(color_mask, mask)
         
         # Remove tiny artifacts (preserve style but remove noise)
         # Use small kernel to avoid over-smoothing
-        kernel = np.ones((2, 2), np.uint8)
-        color_mask = cv2.morphologyEx(color_mask, cv2.MORPH_OPEN, kernel, iterations=1)
-        color_mask = cv2.morphologyEx(color_mask, cv2.MORPH_CLOSE, kernel, iterations=1)
+        color_mask = cv2.morphologyEx(color_mask, cv2.MORPH_OPEN, _KERNEL2, iterations=1)
+        color_mask = cv2.morphologyEx(color_mask, cv2.MORPH_CLOSE, _KERNEL2, iterations=1)
         
         # Only include regions with significant area
-        area = np.sum(color_mask > 128)
-        if area > 100:  # Minimum 100 pixels
-            region = ColorRegion(color_info, color_mask)
+        region = ColorRegion(color_info, color_mask)
+        if region.area > 100:  # Minimum 100 pixels
             regions.append(region)
     
     # Sort by area (largest first) for better layer ordering
-    regions.sort(key=lambda r: np.sum(r.mask > 128), reverse=True)
+    regions.sort(key=lambda r: r.area, reverse=True)
     
     return regions
 
@@ -105,13 +125,11 @@ def clean_boundaries(mask: np.ndarray, preserve_style: bool = True) -> np.ndarra
     """
     if not preserve_style:
         # More aggressive cleaning
-        kernel = np.ones((3, 3), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, iterations=2)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=2)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, _KERNEL3, iterations=2)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, _KERNEL3, iterations=2)
     else:
         # Minimal cleaning - only remove tiny artifacts
-        kernel = np.ones((2, 2), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, iterations=1)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, _KERNEL2, iterations=1)
     
     return mask
 
@@ -120,7 +138,8 @@ def segment_by_color(
     image: np.ndarray,
     mask: np.ndarray,
     color_palette: List[ColorInfo],
-    preserve_style: bool = True
+    preserve_style: bool = True,
+    labels: Optional[np.ndarray] = None
 ) -> List[ColorRegion]:
     """
     Complete segmentation pipeline.
@@ -130,16 +149,21 @@ def segment_by_color(
         mask: Overall drawing mask
         color_palette: List of ColorInfo objects
         preserve_style: Preserve imperfections
+        labels: Optional palette index map from flatten_colors
         
     Returns:
         List of ColorRegion objects
     """
     # Extract color regions
-    regions = extract_color_regions(image, mask, color_palette)
+    regions = extract_color_regions(image, mask, color_palette, labels=labels)
     
-    # Clean boundaries (minimal if preserving style)
-    for region in regions:
-        region.mask = clean_boundaries(region.mask, preserve_style=preserve_style)
+    # Clean boundaries when not preserving style; the minimal cleanup is
+    # already done by the open/close in extract_color_regions
+    if not preserve_style:
+        regions = [
+            ColorRegion(region.color_info, clean_boundaries(region.mask, preserve_style=False))
+            for region in regions
+        ]
     
     return regions
 
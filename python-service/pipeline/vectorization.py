@@ -5,14 +5,23 @@ Stage 4: Vectorization
 - Preserve imperfect style
 """
 
-import cv2
 import numpy as np
 import subprocess
-import tempfile
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from .segmentation import ColorRegion
+from pbm import to_pbm
+
+
+# Potrace runs as a separate process per region, so threads are enough to
+# keep every core busy; the pool is shared across requests to cap the
+# number of concurrent potrace processes.
+_POTRACE_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+# Path element (handles both <path/> and <path></path>)
+_PATH_RE = re.compile(r'<path[^>]*d="([^"]*)"[^>]*(?:/>|>.*?</path>)', re.IGNORECASE | re.DOTALL)
 
 
 def vectorize_mask_to_svg(
@@ -35,70 +44,43 @@ def vectorize_mask_to_svg(
     Returns:
         SVG path string
     """
-    tmp_input_path = None
-    tmp_output_path = None
-    
     try:
-        # Invert mask for potrace (potrace traces black areas)
-        # Our mask has 255 = foreground, but potrace needs 0 = foreground
-        mask_inverted = 255 - mask
-        
-        # Save mask as BMP (potrace doesn't support PNG on macOS)
-        with tempfile.NamedTemporaryFile(suffix='.bmp', delete=False) as tmp_input:
-            cv2.imwrite(tmp_input.name, mask_inverted)
-            tmp_input_path = tmp_input.name
-        
-        # Create temporary SVG output file
-        with tempfile.NamedTemporaryFile(suffix='.svg', delete=False, mode='w', encoding='utf-8') as tmp_output:
-            tmp_output_path = tmp_output.name
+        # Encode mask as raw PBM; foreground (255) is traced without inverting
+        pbm = to_pbm(mask)
         
         # Potrace parameters
         # Low smoothing for style preservation
         opttolerance = '0.2' if preserve_style else '0.4'
         turdsize = '3' if preserve_style else '5'
         
-        # Call potrace
-        subprocess.run([
+        # Call potrace reading PBM from stdin and writing SVG to stdout
+        result = subprocess.run([
             'potrace',
-            tmp_input_path,
-            '-o', tmp_output_path,
             '-s',  # SVG output
             '--turdsize', turdsize,
             '--alphamax', '1.0',
             '--opttolerance', opttolerance,
             '--color', color_hex,
-            '--flat'
-        ], check=True, capture_output=True, text=True, timeout=30)
-        
-        # Read generated SVG
-        if not os.path.exists(tmp_output_path):
-            return ''
-        
-        with open(tmp_output_path, 'r', encoding='utf-8') as f:
-            svg_content = f.read()
+            '--flat',
+            '-o', '-',  # Write SVG to stdout
+            '-'  # Read bitmap from stdin
+        ], input=pbm, check=True, capture_output=True, timeout=30)
         
-        return svg_content
+        return result.stdout.decode('utf-8')
         
     except Exception as e:
         print(f"Error vectorizing mask: {e}")
         return ''
-    finally:
-        # Cleanup
-        for path in [tmp_input_path, tmp_output_path]:
-            if path and os.path.exists(path):
-                try:
-                    os.unlink(path)
-                except:
-                    pass
 
 
-def extract_paths_from_svg(svg_content: str) -> str:
+def extract_paths_from_svg(svg_content: str, color_hex: str) -> str:
     """
     Extract path elements from Potrace SVG.
     Removes SVG wrapper, keeps only paths.
     
     Args:
         svg_content: Full SVG content from Potrace
+        color_hex: Fill color written on every path
         
     Returns:
         Path elements as string
@@ -108,29 +90,11 @@ def extract_paths_from_svg(svg_content: str) -> str:
     
     # Extract paths from SVG
     # Potrace generates SVG with paths, we want to extract them
-    import re
-    
-    # Find all path elements (handle both <path/> and <path></path>)
-    path_pattern = r'<path[^>]*d="([^"]*)"[^>]*(?:/>|>.*?</path>)'
-    matches = re.finditer(path_pattern, svg_content, re.IGNORECASE | re.DOTALL)
-    
-    paths = []
-    for match in matches:
-        path_d = match.group(1)
-        # Extract fill/stroke attributes if present
-        full_match = match.group(0)
-        fill_match = re.search(r'fill="([^"]*)"', full_match, re.IGNORECASE)
-        stroke_match = re.search(r'stroke="([^"]*)"', full_match, re.IGNORECASE)
-        
-        attrs = []
-        if fill_match:
-            attrs.append(f'fill="{fill_match.group(1)}"')
-        if stroke_match:
-            attrs.append(f'stroke="{stroke_match.group(1)}"')
-        if not attrs:
-            attrs.append('fill="black"')
-        
-        paths.append(f'<path {" ".join(attrs)} d="{path_d}"/>')
+    # Any fill/stroke Potrace wrote is replaced by the region color
+    paths = [
+        f'<path fill="{color_hex}" d="{match.group(1)}"/>'
+        for match in _PATH_RE.finditer(svg_content)
+    ]
     
     if not paths:
         return ''
@@ -162,30 +126,31 @@ def vectorize_regions(
         '<g id="drawing">'
     ]
     
-    # Process each color region
-    for region in regions:
-        color_hex = region.color_info.hex
-        
-        # Vectorize mask (Potrace will use the color we specify)
-        svg_content = vectorize_mask_to_svg(
+    # Vectorize all masks concurrently (Potrace will use the color we specify)
+    # map() keeps results in region order, so layer ordering is unchanged
+    svg_contents = _POTRACE_POOL.map(
+        lambda region: vectorize_mask_to_svg(
             region.mask,
-            color_hex,
+            region.color_info.hex,
             image_width,
             image_height,
             preserve_style=preserve_style
-        )
+        ),
+        regions
+    )
+    
+    # Process each color region
+    for region, svg_content in zip(regions, svg_contents):
+        color_hex = region.color_info.hex
         
         if svg_content:
-            # Extract paths from Potrace SVG
-            paths = extract_paths_from_svg(svg_content)
+            # Extract paths from Potrace SVG, already filled with the region color
+            paths = extract_paths_from_svg(svg_content, color_hex)
             
             if paths:
                 # Wrap in group with color (override any colors from Potrace)
                 svg_parts.append(f'<g fill="{color_hex}" stroke="none">')
-                # Replace fill colors in paths to ensure correct color
-                paths_colored = paths.replace('fill="black"', f'fill="{color_hex}"')
-                paths_colored = re.sub(r'fill="[^"]*"', f'fill="{color_hex}"', paths_colored)
-                svg_parts.append(paths_colored)
+                svg_parts.append(paths)
                 svg_parts.append('</g>')
     
     svg_parts.append('</g>')
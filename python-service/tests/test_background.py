@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+import app
+
+
+def thin_stroke_image(seed=3):
+    """Light paper with a few dark 4-6px strokes."""
+    image = np.full((750, 1000, 3), 245, np.uint8)
+    rng = np.random.default_rng(seed)
+    for _ in range(5):
+        start = (int(rng.integers(0, 1000)), int(rng.integers(0, 750)))
+        end = (int(rng.integers(0, 1000)), int(rng.integers(0, 750)))
+        cv2.line(image, start, end, (40, 40, 40), int(rng.integers(4, 7)))
+    return image
+
+
+def test_fast_mode_keeps_thin_strokes():
+    image = thin_stroke_image()
+    _, normal = app.detect_background(image)
+    _, fast = app.detect_background(image, fast_mode=True)
+
+    normal_area = cv2.countNonZero(normal)
+    assert normal_area > 0
+    # Every stroke pixel of the full-resolution mask is still in the fast mask
+    missed = cv2.countNonZero(cv2.bitwise_and(normal, cv2.bitwise_not(fast)))
+    assert missed <= 0.01 * normal_area
+    # ...and the fast mask is only padded slightly, not a different shape
+    assert cv2.countNonZero(fast) <= 2 * normal_area
+
+
+def test_fast_mode_binary_matches_normal():
+    image = thin_stroke_image(seed=7)
+    results = []
+    for fast_mode in (False, True):
+        gray, mask = app.detect_background(image, fast_mode=fast_mode)
+        binary = app.convert_to_bw(gray, preserve_style=True)
+        app.apply_masks_to_binary(binary, mask)
+        results.append(binary)
+
+    normal, fast = results
+    normal_area = cv2.countNonZero(normal)
+    assert normal_area > 0
+    assert cv2.countNonZero(cv2.bitwise_xor(normal, fast)) <= 0.01 * normal_area
@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+import pytest
+
+import app
+
+
+def reference_clean_noise(binary_image, min_artifact_size=100):
+    """Previous implementation: one masked write per kept component."""
+    cleaned = cv2.medianBlur(binary_image, 3)
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(cleaned, connectivity=8)
+    output = np.zeros_like(cleaned)
+    for i in range(1, num_labels):
+        if stats[i, cv2.CC_STAT_AREA] >= min_artifact_size:
+            output[labels == i] = 255
+    kernel = np.ones((3, 3), np.uint8)
+    output = cv2.morphologyEx(output, cv2.MORPH_CLOSE, kernel, iterations=1)
+    return cv2.morphologyEx(output, cv2.MORPH_OPEN, kernel, iterations=1)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('min_artifact_size', [1, 20, 100])
+def test_clean_noise_matches_reference(seed, min_artifact_size):
+    rng = np.random.default_rng(seed)
+    binary = np.where(rng.random((120, 160)) > 0.93, 255, 0).astype(np.uint8)
+    for _ in range(6):
+        start = tuple(int(v) for v in rng.integers(0, 160, 2))
+        end = tuple(int(v) for v in rng.integers(0, 120, 2))
+        cv2.line(binary, start, end, 255, int(rng.integers(1, 5)))
+
+    np.testing.assert_array_equal(
+        app.clean_noise(binary, min_artifact_size),
+        reference_clean_noise(binary, min_artifact_size)
+    )
@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+
+from pipeline.color_cleanup import (
+    ColorInfo,
+    apply_palette_lut,
+    build_palette_lut,
+    extract_dominant_colors,
+    flatten_colors,
+    nearest_palette_indices,
+)
+
+
+def reference_nearest(pixels, palette):
+    """Previous implementation: full (N, K, 3) broadcast."""
+    distances = np.sqrt(((pixels[:, np.newaxis, :] - palette[np.newaxis, :, :]) ** 2).sum(axis=2))
+    return np.argmin(distances, axis=1)
+
+
+def test_nearest_palette_indices_matches_broadcast():
+    rng = np.random.default_rng(0)
+    for k in range(1, 8):
+        palette = rng.integers(0, 256, (k, 3)).astype(np.float32)
+        pixels = rng.integers(0, 256, (5000, 3)).astype(np.float32)
+        expected = reference_nearest(pixels, palette)
+        got = nearest_palette_indices(pixels, palette)
+        # Only exact distance ties may resolve differently
+        mismatch = got != expected
+        if mismatch.any():
+            d = ((pixels[:, None, :] - palette[None, :, :]) ** 2).sum(axis=2)
+            rows = np.flatnonzero(mismatch)
+            np.testing.assert_allclose(d[rows, got[rows]], d[rows, expected[rows]], rtol=1e-5)
+
+
+def test_palette_lut_agrees_with_exact_search():
+    rng = np.random.default_rng(1)
+    palette = rng.integers(0, 256, (6, 3)).astype(np.float32)
+    lut = build_palette_lut(palette)
+
+    pixels = rng.integers(0, 256, (20000, 3)).astype(np.uint8)
+    got = apply_palette_lut(pixels, lut)
+    expected = nearest_palette_indices(pixels.astype(np.float32), palette)
+    assert (got == expected).mean() > 0.95
+
+    # A wrong pick is never far from optimal: the table is exact at cell centers,
+    # so the error is bounded by the cell diagonal
+    d = np.sqrt(((pixels[:, None, :].astype(np.float32) - palette[None, :, :]) ** 2).sum(axis=2))
+    rows = np.arange(len(pixels))
+    assert (d[rows, got] - d[rows, expected]).max() <= 8 * np.sqrt(3)
+
+
+def test_flatten_colors_labels_match_flattened_image():
+    image = np.full((60, 80, 3), 250, np.uint8)
+    image[10:30, 10:40] = (10, 10, 200)
+    image[35:55, 40:70] = (200, 40, 10)
+    mask = np.where(image.min(axis=2) < 200, 255, 0).astype(np.uint8)
+    palette = [ColorInfo((200, 10, 10), 1, 50.0), ColorInfo((10, 40, 200), 1, 50.0)]
+
+    flattened, labels = flatten_colors(image, mask, palette, return_labels=True)
+    assert (labels[mask == 0] == 255).all()
+    assert (labels[15, 15], labels[40, 50]) == (0, 1)
+    assert tuple(flattened[15, 15]) == (10, 10, 200)
+
+
+def test_extract_dominant_colors_on_elongated_image():
+    image = np.full((3, 4000, 3), 250, np.uint8)
+    image[:, :2000] = (10, 10, 200)
+    image[:, 2000:3000] = (200, 40, 10)
+    image[:, 3000:] = (20, 160, 20)
+    mask = np.full((3, 4000), 255, np.uint8)
+
+    colors, mapped = extract_dominant_colors(image, mask, n_colors=3)
+    assert {c.hex for c in colors} == {'#c80a0a', '#0a28c8', '#14a014'}
+    assert mapped.shape == image.shape
+
+
+def test_downscaled_kmeans_matches_full_resolution():
+    image = np.full((1200, 1200, 3), 240, np.uint8)
+    rng = np.random.default_rng(0)
+    colors = [(20, 20, 200), (200, 60, 10), (30, 160, 30)]
+    for i in range(30):
+        start = tuple(int(v) for v in rng.integers(0, 1200, 2))
+        end = tuple(int(v) for v in rng.integers(0, 1200, 2))
+        cv2.line(image, start, end, colors[i % 3], int(rng.integers(5, 20)))
+    mask = np.where(image.min(axis=2) < 200, 255, 0).astype(np.uint8)
+
+    found, _ = extract_dominant_colors(image, mask, n_colors=3)
+    got = sorted(c.rgb for c in found)
+    expected = sorted((r, g, b) for b, g, r in colors)
+    np.testing.assert_allclose(got, expected, atol=2)
+
+
+def test_color_info_keeps_identity_semantics():
+    a = ColorInfo((10, 20, 30), 5, 12.5)
+    b = ColorInfo((10, 20, 30), 5, 12.5)
+
+    assert a != b
+    assert len({a, b}) == 2
+    assert a.hex == '#0a141e'
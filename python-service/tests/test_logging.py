@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def root_level_with(log_level):
+    env = dict(os.environ, LOG_LEVEL=log_level)
+    result = subprocess.run(
+        [sys.executable, '-c', 'import logging, app; print(logging.getLogger().level)'],
+        cwd=SERVICE_DIR, env=env, capture_output=True, text=True, timeout=120, check=True
+    )
+    return int(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def test_invalid_log_level_falls_back_to_info():
+    level, stderr = root_level_with('verbose')
+    assert level == 20
+    assert "Unknown LOG_LEVEL 'VERBOSE'" in stderr
+
+
+def test_log_level_is_case_insensitive():
+    level, _ = root_level_with('debug')
+    assert level == 10
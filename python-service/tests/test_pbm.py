@@ -0,0 +1,21 @@
+import numpy as np
+
+from pbm import to_pbm
+
+
+def test_to_pbm_packs_rows_with_padding():
+    binary = np.zeros((2, 10), np.uint8)
+    binary[0, 0] = 255
+    binary[0, 9] = 255
+    binary[1, 1:9] = 255
+
+    assert to_pbm(binary) == (
+        b'P4\n10 2\n'
+        + bytes([0b10000000, 0b01000000])  # row 0: pixel 0, pixel 9 (padded to 16 bits)
+        + bytes([0b01111111, 0b10000000])  # row 1: pixels 1-8
+    )
+
+
+def test_to_pbm_thresholds_at_128():
+    binary = np.array([[127, 128, 0, 255, 0, 0, 0, 0]], np.uint8)
+    assert to_pbm(binary)[-1] == 0b01010000
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from pipeline import postprocessing
+from pipeline.postprocessing import (
+    _format_path_data,
+    _parse_path_data,
+    optimize_svg_paths,
+    simplify_path_data,
+)
+
+
+POTRACE_PATH = (
+    'M2110 3197 c-26 -41 -60 -93 -75 -115 l10 0 10 1 10 -1 10 0 0 10 0 10 '
+    'c5 5 10 10 15 15 l-5 0 -5 0 z m100 0 l10 0 10 0 z'
+)
+
+
+@pytest.mark.parametrize('d', [
+    POTRACE_PATH,
+    'M0 0 l10 0 0 10 -10 0 z',
+    'M1.5 -2.25 c0.5 0.5 1 1 1.5 1.5 z',
+])
+def test_parse_format_round_trip(d):
+    assert _format_path_data(_parse_path_data(d)) == d
+
+
+def test_parse_absolute_commands():
+    segments = _parse_path_data('M10 10 L20 10 C20 20 30 20 30 30 Z')
+    assert segments == [
+        ('M', (10.0, 10.0)),
+        ('L', (20.0, 10.0)),
+        ('C', (20.0, 20.0, 30.0, 20.0, 30.0, 30.0)),
+        ('Z', ()),
+    ]
+
+
+def test_unsupported_commands_are_left_alone():
+    assert _parse_path_data('M0 0 h10 v10') is None
+    assert simplify_path_data('M0 0 h10 v10', 5.0) == 'M0 0 h10 v10'
+
+
+def test_corner_with_long_and_short_legs_is_kept():
+    # 10:1 legs: the corner deviates ~10 units from the chord
+    d = 'M0 0 l100 0 0 10 z'
+    assert simplify_path_data(d, 5.0) == d
+
+
+def test_nearly_collinear_points_are_dropped():
+    assert simplify_path_data('M0 0 l50 1 50 -1 0 40 z', 5.0) == 'M0 0 l100 0 0 40 z'
+
+
+def test_curves_are_not_touched():
+    d = 'M0 0 c1 1 2 2 3 3 c1 1 2 2 3 3 z'
+    assert simplify_path_data(d, 50.0) == d
+
+
+def test_optimize_svg_paths_rewrites_only_path_data():
+    svg = '<svg><g fill="#f00"><path fill="#f00" d="M0 0 l50 1 50 -1 z"/></g></svg>'
+    assert optimize_svg_paths(svg) == '<svg><g fill="#f00"><path fill="#f00" d="M0 0 l100 0 z"/></g></svg>'
+    assert optimize_svg_paths(svg, tolerance=0) == svg
+
+
+def test_rdp_kernel_matches_python():
+    rdp = postprocessing._rdp_keep
+    reference = getattr(rdp, 'py_func', rdp)
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        points = np.cumsum(rng.normal(0, 5, (int(rng.integers(2, 200)), 2)), axis=0)
+        eps2 = float(rng.random() * 25)
+        np.testing.assert_array_equal(rdp(points, eps2), reference(points, eps2))
@@ -0,0 +1,75 @@
+import re
+import shutil
+
+import numpy as np
+import pytest
+
+import app
+from pipeline.postprocessing import _parse_path_data
+
+
+def square_bitmap():
+    binary = np.zeros((100, 200), np.uint8)
+    binary[10:30, 50:90] = 255
+    return binary
+
+
+def path_segments(svg):
+    d = re.search(r'<path[^>]*\sd="([^"]*)"', svg).group(1)
+    return _parse_path_data(d)
+
+
+@pytest.mark.skipif(not app.POTRACER_AVAILABLE, reason='potracer not installed')
+def test_potracer_traces_drawing_in_potrace_units():
+    binary = square_bitmap()
+    svg = app.trace_with_potracer(binary, '#000000', turdsize=2)
+    assert 'transform="translate(0.000000,100.000000) scale(0.100000,-0.100000)"' in svg
+
+    # Map every on-curve point back to pixels through the SVG transform
+    points = [values[-2:] for kind, values in path_segments(svg) if kind != 'Z']
+    xs = [x / 10 for x, _ in points]
+    ys = [100 - y / 10 for _, y in points]
+    assert (min(xs), max(xs)) == (50, 90)
+    assert (min(ys), max(ys)) == (10, 30)
+
+
+@pytest.mark.skipif(not app.POTRACER_AVAILABLE, reason='potracer not installed')
+@pytest.mark.skipif(shutil.which('potrace') is None, reason='potrace binary not installed')
+def test_potracer_matches_potrace_cli():
+    binary = np.zeros((60, 80), np.uint8)
+    binary[10:50, 10:30] = 255
+    binary[20:40, 40:70] = 255
+    binary[25:35, 50:60] = 0
+
+    cli = path_segments(app.trace_with_potrace_cli(binary, '#000000', turdsize=2))
+    inprocess = path_segments(app.trace_with_potracer(binary, '#000000', turdsize=2))
+
+    assert [kind for kind, _ in cli] == [kind for kind, _ in inprocess]
+    for (_, a), (_, b) in zip(cli, inprocess):
+        np.testing.assert_allclose(a, b, atol=1)
+
+
+def test_vectorize_surfaces_potracer_errors_without_binary(monkeypatch):
+    def broken(*args, **kwargs):
+        raise TypeError('unexpected point type')
+
+    def missing_binary(*args, **kwargs):
+        raise FileNotFoundError('potrace')
+
+    monkeypatch.setattr(app, 'POTRACER_AVAILABLE', True)
+    monkeypatch.setattr(app, 'POTRACE_CLI_AVAILABLE', False)
+    monkeypatch.setattr(app, 'trace_with_potracer', broken)
+    monkeypatch.setattr(app, 'trace_with_potrace_cli', missing_binary)
+
+    with pytest.raises(TypeError, match='unexpected point type'):
+        app.vectorize_with_potrace(square_bitmap())
+
+
+def test_vectorize_prefers_potrace_binary(monkeypatch):
+    cli_svg = '<svg xmlns="http://www.w3.org/2000/svg"><path d="M0 0 l10 0 0 10 z"/></svg>'
+    monkeypatch.setattr(app, 'POTRACER_AVAILABLE', True)
+    monkeypatch.setattr(app, 'POTRACE_CLI_AVAILABLE', True)
+    monkeypatch.setattr(app, 'trace_with_potracer', lambda *args, **kwargs: pytest.fail('potracer used'))
+    monkeypatch.setattr(app, 'trace_with_potrace_cli', lambda *args, **kwargs: cli_svg)
+
+    assert app.vectorize_with_potrace(square_bitmap()) == cli_svg
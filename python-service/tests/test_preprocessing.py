@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+import pytest
+
+from pipeline.preprocessing import (
+    is_lighting_balanced,
+    normalize_lighting,
+    reduce_noise_preserve_strokes,
+)
+
+
+def noisy_drawing(seed):
+    """Paper with a few crayon strokes and sensor noise."""
+    image = np.full((160, 200, 3), 235, np.uint8)
+    cv2.line(image, (10, 20), (190, 140), (40, 40, 200), 5)
+    cv2.circle(image, (60, 100), 35, (200, 80, 30), -1)
+    cv2.rectangle(image, (120, 15), (180, 60), (30, 150, 30), 3)
+    clean = image.copy()
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 6, image.shape)
+    noisy = np.clip(image + noise, 0, 255).astype(np.uint8)
+    return clean, noisy
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_guided_filter_tracks_bilateral(seed):
+    clean, noisy = noisy_drawing(seed)
+
+    guided = reduce_noise_preserve_strokes(noisy).astype(np.float64)
+    bilateral = cv2.bilateralFilter(noisy, 9, 75, 75).astype(np.float64)
+
+    assert np.abs(guided - bilateral).mean() < 3.0
+    # Removes most of the noise, if a little less than the bilateral filter
+    assert np.abs(guided - clean).mean() < 0.5 * np.abs(noisy.astype(np.float64) - clean).mean()
+
+
+def test_guided_filter_keeps_stroke_edges():
+    clean, noisy = noisy_drawing(0)
+
+    guided = reduce_noise_preserve_strokes(noisy)
+
+    # Flat paper gets smoother
+    paper = (slice(142, 158), slice(5, 90))
+    assert guided[paper].std() < noisy[paper].std() / 2
+    # Step across the filled circle's edge stays sharp
+    row = cv2.cvtColor(guided, cv2.COLOR_BGR2GRAY)[100].astype(np.int64)
+    assert np.abs(np.diff(row[85:110])).max() > 40
+
+
+def reference_lighting_balanced(l_channel):
+    """The check written directly with np.percentile and np.std."""
+    p5, p95 = np.percentile(l_channel, [5, 95], method='inverted_cdf')
+    return (p95 - p5) < 180 and l_channel.std() > 30
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_lighting_balanced_matches_percentiles(seed):
+    rng = np.random.default_rng(seed)
+    low, high = np.sort(rng.integers(0, 256, 2))
+    l_channel = rng.integers(low, high + 1, (rng.integers(1, 80), rng.integers(1, 80)), dtype=np.uint8)
+
+    assert is_lighting_balanced(l_channel) == reference_lighting_balanced(l_channel)
+
+
+def split_merge_clahe(image):
+    """normalize_lighting's CLAHE path as it was written with split/merge."""
+    lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+    l = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(l)
+    return cv2.cvtColor(cv2.merge([l, a, b]), cv2.COLOR_LAB2BGR)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_normalize_lighting_matches_split_merge(seed):
+    # A photo with a strong lighting gradient, so the CLAHE path runs
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, 240)[None, :, None]
+    image = np.clip(gradient + rng.normal(0, 4, (180, 240, 3)), 0, 255).astype(np.uint8)
+    cv2.circle(image, (120, 90), 40, (30, 60, 200), -1)
+    assert not is_lighting_balanced(cv2.cvtColor(image, cv2.COLOR_BGR2LAB)[:, :, 0])
+
+    np.testing.assert_array_equal(normalize_lighting(image), split_merge_clahe(image))
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+from pipeline.color_cleanup import ColorInfo, create_color_map
+from pipeline.segmentation import ColorRegion, extract_color_regions, mask_stats
+
+
+def drawing():
+    image = np.full((200, 260, 3), 250, np.uint8)
+    cv2.circle(image, (70, 70), 50, (40, 40, 200), -1)
+    cv2.rectangle(image, (120, 100), (240, 180), (200, 60, 40), -1)
+    cv2.line(image, (0, 190), (250, 10), (40, 180, 40), 6)
+    rng = np.random.default_rng(0)
+    image = cv2.add(image, rng.integers(0, 8, image.shape, dtype=np.uint8))
+    mask = np.where(image.min(axis=2) < 220, 255, 0).astype(np.uint8)
+    return image, mask
+
+
+def test_label_regions_match_color_matching():
+    image, mask = drawing()
+    palette, flattened, labels = create_color_map(image, mask, n_colors=3, return_labels=True)
+
+    from_labels = extract_color_regions(flattened, mask, palette, labels=labels)
+    from_colors = extract_color_regions(flattened, mask, palette)
+
+    assert [r.color_info.hex for r in from_labels] == [r.color_info.hex for r in from_colors]
+    for a, b in zip(from_labels, from_colors):
+        np.testing.assert_array_equal(a.mask, b.mask)
+
+
+def random_masks():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        h, w = rng.integers(1, 120, 2)
+        mask = np.zeros((h, w), np.uint8)
+        for _ in range(rng.integers(1, 4)):
+            x, y = rng.integers(0, w), rng.integers(0, h)
+            cv2.ellipse(mask, (int(x), int(y)), tuple(int(v) for v in rng.integers(0, 30, 2)),
+                        0, 0, 360, 255, -1)
+        yield mask
+    yield np.full((7, 9), 255, np.uint8)
+
+
+def test_mask_stats_matches_opencv():
+    for mask in random_masks():
+        expected = (cv2.countNonZero(mask), *cv2.boundingRect(mask))
+        assert mask_stats(mask) == expected
+
+
+def test_mask_stats_empty_mask():
+    assert mask_stats(np.zeros((5, 5), np.uint8)) == (0, 0, 0, 0, 0)
+
+
+def test_color_region_stats():
+    mask = np.zeros((50, 60), np.uint8)
+    mask[10:20, 5:40] = 255
+    region = ColorRegion(ColorInfo((255, 0, 0), 1, 100.0), mask)
+
+    assert region.area == 350
+    assert region.bounds == {'x': 5, 'y': 10, 'width': 35, 'height': 10}